@@ -7,22 +7,62 @@ AUTHORIZATION: Kaiser Permanente Legal Dept, Feb 5, 2026
 - Valid Feb 5-12, 2026
 - Max 10 complete runs
 
+Requirements:
+    pip install requests
+
 Usage:
     python kp-scraper.py [--test] [--resume] [--delay 15]
 """
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
 import csv
+import json
+import os
 import time
 import re
+import socket
 import argparse
+import queue
+import threading
 import urllib3
 from datetime import datetime
-from typing import Optional, Tuple
+from html.parser import HTMLParser
+from typing import NamedTuple, Optional, Tuple
 
 BASE_URL = "https://neonatalsepsiscalculator.kaiserpermanente.org/InfectionProbabilityCalculator.aspx"
 OUTPUT_FILE = "kp-eos-data.csv"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+CACHE_FILE = ".kp-scraper-cache.json"  # Initial-page validators + hidden fields
+
+# Transient failures are retried by the scraper itself, behind the rate limiter
+REQUEST_RETRIES = 3
+RETRY_STATUSES = frozenset((502, 503, 504))
+
+# Hidden form fields on the initial page (matched on raw bytes, no decode)
+HIDDEN_FIELDS = ('__VIEWSTATE', '__VIEWSTATEGENERATOR', '__EVENTVALIDATION')
+RE_HIDDEN_INPUT = re.compile(rb'name="(__VIEWSTATE|__VIEWSTATEGENERATOR|__EVENTVALIDATION)"[^>]*value="([^"]*)"')
+
+# Streaming: stop reading a postback once both hidden fields have arrived
+# (they follow the UpdatePanel content in the delta response)
+STREAM_CHUNK_SIZE = 16384
+STREAM_ANCHORS = (b'|__VIEWSTATE|', b'|__EVENTVALIDATION|')
+
+# Hidden fields echoed back in the delta; only used when the record walk
+# stops before reaching them (e.g. a length that doesn't match)
+RE_AJAX_HIDDEN = re.compile(r'\|hiddenField\|(?P<field>__VIEWSTATE|__EVENTVALIDATION)\|(?P<value>[^|]*)\|')
+
+# Result labels in the AJAX UpdatePanel response
+LABEL_ID_PREFIX = "MainContent_InfectionProbabilityCalculations_lbl"
+LABEL_NAMES = ("EOS", "WellAppearing", "Equivocal", "Clinical")
+
+# Result labels and the validation error, matched in one pass over the
+# UpdatePanel HTML fragments only
+RE_RESULT = re.compile(
+    r'id="MainContent_InfectionProbabilityCalculations_lbl(?P<label>EOS|WellAppearing|Equivocal|Clinical)"[^>]*>\s*(?P<value>[0-9.]*)\s*<'
+    r'|class="ErrorMessage"[^>]*>(?P<error>[^<]+)'
+)
 
 # Incidence values - DIFFERENT for 2017 vs 2024 models!
 # 2017 model uses these values (from original page):
@@ -57,342 +97,693 @@ INCIDENCE_2024 = {
     "4.0": "59.0",
 }
 
+# Hidden radio button values for the form inputs
+MODEL_MAP = {
+    "2017": "rbUSAHidden1",
+    "2024": "rbUSAHidden2",
+}
+
+GBS_MAP = {
+    "Negative": "rbGBSHidden1",
+    "Positive": "rbGBSHidden2",
+    "Unknown": "rbGBSHidden3",
+}
+
+ABX_MAP = {
+    "broad4": "rbIntraHidden1",  # Broad spectrum > 4 hrs
+    "broad2": "rbIntraHidden2",  # Broad spectrum 2-3.9 hrs
+    "gbs2": "rbIntraHidden3",    # GBS specific > 2 hrs
+    "none": "rbIntraHidden4",    # No antibiotics or < 2 hrs
+}
+
+
+class Case(NamedTuple):
+    """One calculator input combination."""
+    model: str      # "2017" or "2024"
+    ga_w: int       # Gestational age, weeks
+    ga_d: int       # Gestational age, days
+    temp_f: float   # Highest maternal temperature, F
+    rom: int        # ROM duration, hours
+    gbs: str        # Key of GBS_MAP
+    abx: str        # Key of ABX_MAP
+    incidence: str  # Key of INCIDENCE_2017 / INCIDENCE_2024
+
+
 # Test vectors - systematic permutation of key variables
 TEST_CASES = [
-    # Format: (Model, GA_weeks, GA_days, Temp_F, ROM_hours, GBS, Antibiotics, Incidence)
+    # Format: Case(Model, GA_weeks, GA_days, Temp_F, ROM_hours, GBS, Antibiotics, Incidence)
 
     # ============================================================
     # 2024 MODEL - COMPREHENSIVE TEST CASES
     # ============================================================
 
     # === 2024 BASE CASE ===
-    ("2024", 40, 0, 98.0, 0, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 98.0, 0, "Negative", "none", "0.5"),
 
     # === 2024 TEMPERATURE SENSITIVITY ===
-    ("2024", 40, 0, 98.5, 0, "Negative", "none", "0.5"),
-    ("2024", 40, 0, 99.0, 0, "Negative", "none", "0.5"),
-    ("2024", 40, 0, 99.5, 0, "Negative", "none", "0.5"),
-    ("2024", 40, 0, 100.0, 0, "Negative", "none", "0.5"),
-    ("2024", 40, 0, 100.5, 0, "Negative", "none", "0.5"),
-    ("2024", 40, 0, 101.0, 0, "Negative", "none", "0.5"),
-    ("2024", 40, 0, 101.5, 0, "Negative", "none", "0.5"),
-    ("2024", 40, 0, 102.0, 0, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 98.5, 0, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 99.0, 0, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 99.5, 0, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 100.0, 0, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 100.5, 0, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 101.0, 0, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 101.5, 0, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 102.0, 0, "Negative", "none", "0.5"),
 
     # === 2024 ROM SENSITIVITY ===
-    ("2024", 40, 0, 98.0, 6, "Negative", "none", "0.5"),
-    ("2024", 40, 0, 98.0, 12, "Negative", "none", "0.5"),
-    ("2024", 40, 0, 98.0, 18, "Negative", "none", "0.5"),
-    ("2024", 40, 0, 98.0, 24, "Negative", "none", "0.5"),
-    ("2024", 40, 0, 98.0, 36, "Negative", "none", "0.5"),
-    ("2024", 40, 0, 98.0, 48, "Negative", "none", "0.5"),
-    ("2024", 40, 0, 98.0, 72, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 98.0, 6, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 98.0, 12, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 98.0, 18, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 98.0, 24, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 98.0, 36, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 98.0, 48, "Negative", "none", "0.5"),
+    Case("2024", 40, 0, 98.0, 72, "Negative", "none", "0.5"),
 
     # === 2024 GESTATIONAL AGE ===
-    ("2024", 35, 0, 98.0, 0, "Negative", "none", "0.5"),
-    ("2024", 36, 0, 98.0, 0, "Negative", "none", "0.5"),
-    ("2024", 37, 0, 98.0, 0, "Negative", "none", "0.5"),
-    ("2024", 38, 0, 98.0, 0, "Negative", "none", "0.5"),
-    ("2024", 39, 0, 98.0, 0, "Negative", "none", "0.5"),
-    ("2024", 41, 0, 98.0, 0, "Negative", "none", "0.5"),
-    ("2024", 42, 0, 98.0, 0, "Negative", "none", "0.5"),
+    Case("2024", 35, 0, 98.0, 0, "Negative", "none", "0.5"),
+    Case("2024", 36, 0, 98.0, 0, "Negative", "none", "0.5"),
+    Case("2024", 37, 0, 98.0, 0, "Negative", "none", "0.5"),
+    Case("2024", 38, 0, 98.0, 0, "Negative", "none", "0.5"),
+    Case("2024", 39, 0, 98.0, 0, "Negative", "none", "0.5"),
+    Case("2024", 41, 0, 98.0, 0, "Negative", "none", "0.5"),
+    Case("2024", 42, 0, 98.0, 0, "Negative", "none", "0.5"),
 
     # === 2024 GA with days ===
-    ("2024", 37, 3, 98.0, 0, "Negative", "none", "0.5"),
-    ("2024", 39, 3, 98.0, 0, "Negative", "none", "0.5"),
-    ("2024", 40, 3, 98.0, 0, "Negative", "none", "0.5"),
+    Case("2024", 37, 3, 98.0, 0, "Negative", "none", "0.5"),
+    Case("2024", 39, 3, 98.0, 0, "Negative", "none", "0.5"),
+    Case("2024", 40, 3, 98.0, 0, "Negative", "none", "0.5"),
 
     # === 2024 GBS STATUS (KEY - Unknown should be higher than 2017) ===
-    ("2024", 40, 0, 98.0, 0, "Positive", "none", "0.5"),
-    ("2024", 40, 0, 98.0, 0, "Unknown", "none", "0.5"),
+    Case("2024", 40, 0, 98.0, 0, "Positive", "none", "0.5"),
+    Case("2024", 40, 0, 98.0, 0, "Unknown", "none", "0.5"),
 
     # === 2024 ANTIBIOTICS ===
-    ("2024", 40, 0, 98.0, 0, "Positive", "broad4", "0.5"),
-    ("2024", 40, 0, 98.0, 0, "Positive", "broad2", "0.5"),
-    ("2024", 40, 0, 98.0, 0, "Positive", "gbs2", "0.5"),
+    Case("2024", 40, 0, 98.0, 0, "Positive", "broad4", "0.5"),
+    Case("2024", 40, 0, 98.0, 0, "Positive", "broad2", "0.5"),
+    Case("2024", 40, 0, 98.0, 0, "Positive", "gbs2", "0.5"),
 
     # === 2024 COMBINED SCENARIOS ===
-    ("2024", 35, 0, 101.0, 24, "Positive", "none", "0.5"),
-    ("2024", 38, 0, 100.0, 18, "Unknown", "none", "0.5"),
-    ("2024", 37, 0, 100.5, 12, "Negative", "none", "0.5"),
-    ("2024", 39, 0, 99.5, 6, "Positive", "none", "0.5"),
+    Case("2024", 35, 0, 101.0, 24, "Positive", "none", "0.5"),
+    Case("2024", 38, 0, 100.0, 18, "Unknown", "none", "0.5"),
+    Case("2024", 37, 0, 100.5, 12, "Negative", "none", "0.5"),
+    Case("2024", 39, 0, 99.5, 6, "Positive", "none", "0.5"),
 
     # === 2024 HIGH RISK COMBINATIONS ===
-    ("2024", 35, 0, 102.0, 48, "Positive", "none", "0.5"),
-    ("2024", 36, 0, 101.0, 36, "Unknown", "none", "0.5"),
+    Case("2024", 35, 0, 102.0, 48, "Positive", "none", "0.5"),
+    Case("2024", 36, 0, 101.0, 36, "Unknown", "none", "0.5"),
 
     # ============================================================
     # 2017 MODEL - KEY COMPARISON CASES
     # ============================================================
 
     # === 2017 BASE CASE ===
-    ("2017", 40, 0, 98.0, 0, "Negative", "none", "0.5"),
+    Case("2017", 40, 0, 98.0, 0, "Negative", "none", "0.5"),
 
     # === 2017 TEMPERATURE (for comparison) ===
-    ("2017", 40, 0, 99.0, 0, "Negative", "none", "0.5"),
-    ("2017", 40, 0, 100.0, 0, "Negative", "none", "0.5"),
-    ("2017", 40, 0, 101.0, 0, "Negative", "none", "0.5"),
-    ("2017", 40, 0, 102.0, 0, "Negative", "none", "0.5"),
+    Case("2017", 40, 0, 99.0, 0, "Negative", "none", "0.5"),
+    Case("2017", 40, 0, 100.0, 0, "Negative", "none", "0.5"),
+    Case("2017", 40, 0, 101.0, 0, "Negative", "none", "0.5"),
+    Case("2017", 40, 0, 102.0, 0, "Negative", "none", "0.5"),
 
     # === 2017 ROM (for comparison) ===
-    ("2017", 40, 0, 98.0, 12, "Negative", "none", "0.5"),
-    ("2017", 40, 0, 98.0, 24, "Negative", "none", "0.5"),
-    ("2017", 40, 0, 98.0, 48, "Negative", "none", "0.5"),
+    Case("2017", 40, 0, 98.0, 12, "Negative", "none", "0.5"),
+    Case("2017", 40, 0, 98.0, 24, "Negative", "none", "0.5"),
+    Case("2017", 40, 0, 98.0, 48, "Negative", "none", "0.5"),
 
     # === 2017 GA (for comparison) ===
-    ("2017", 35, 0, 98.0, 0, "Negative", "none", "0.5"),
-    ("2017", 37, 0, 98.0, 0, "Negative", "none", "0.5"),
-    ("2017", 39, 0, 98.0, 0, "Negative", "none", "0.5"),
+    Case("2017", 35, 0, 98.0, 0, "Negative", "none", "0.5"),
+    Case("2017", 37, 0, 98.0, 0, "Negative", "none", "0.5"),
+    Case("2017", 39, 0, 98.0, 0, "Negative", "none", "0.5"),
 
     # === 2017 GBS (KEY COMPARISON - Unknown should be ~same as Negative) ===
-    ("2017", 40, 0, 98.0, 0, "Positive", "none", "0.5"),
-    ("2017", 40, 0, 98.0, 0, "Unknown", "none", "0.5"),
+    Case("2017", 40, 0, 98.0, 0, "Positive", "none", "0.5"),
+    Case("2017", 40, 0, 98.0, 0, "Unknown", "none", "0.5"),
 
     # === 2017 COMBINED for comparison ===
-    ("2017", 35, 0, 101.0, 24, "Positive", "none", "0.5"),
-    ("2017", 38, 0, 100.0, 18, "Unknown", "none", "0.5"),
+    Case("2017", 35, 0, 101.0, 24, "Positive", "none", "0.5"),
+    Case("2017", 38, 0, 100.0, 18, "Unknown", "none", "0.5"),
 ]
 
 
+def _iter_ajax_parts(text: str):
+    """Yield (type, id, content) for each record of an ASP.NET AJAX delta response.
+
+    The delta is a run of `length|type|id|content|` records where length is
+    the character count of content, so each record is sliced out directly
+    instead of being searched for. Stops at the first malformed or truncated
+    record.
+    """
+    pos = 0
+    while pos < len(text):
+        len_end = text.find('|', pos)
+        type_end = text.find('|', len_end + 1) if len_end != -1 else -1
+        id_end = text.find('|', type_end + 1) if type_end != -1 else -1
+        if id_end == -1:
+            return
+        try:
+            length = int(text[pos:len_end])
+        except ValueError:
+            return
+
+        start = id_end + 1
+        stop = start + length
+        if text[stop:stop + 1] != '|':
+            return
+
+        yield text[len_end + 1:type_end], text[type_end + 1:id_end], text[start:stop]
+        pos = stop + 1
+
+
+class _KPExtractor(HTMLParser):
+    """One-pass extractor for the handful of elements the scraper needs.
+
+    Keeps the value of <input> elements and the text of <span> elements whose
+    name/id is in TARGETS; no document tree is built.
+    """
+
+    TARGETS = frozenset(HIDDEN_FIELDS + tuple(LABEL_ID_PREFIX + name for name in LABEL_NAMES))
+
+    def __init__(self):
+        super().__init__()
+        self.fields = {}
+        self._capture_id = None
+
+    @classmethod
+    def extract(cls, body: bytes) -> dict:
+        """Return {name_or_id: value} for every target found in the document."""
+        parser = cls()
+        parser.feed(body.decode('utf-8', 'replace'))
+        parser.close()
+        return parser.fields
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'input':
+            attrs = dict(attrs)
+            if attrs.get('name') in self.TARGETS:
+                self.fields[attrs['name']] = attrs.get('value') or ''
+        elif tag == 'span':
+            attrs = dict(attrs)
+            if attrs.get('id') in self.TARGETS:
+                self._capture_id = attrs['id']
+                self.fields[self._capture_id] = ''
+
+    def handle_endtag(self, tag):
+        if tag == 'span':
+            self._capture_id = None
+
+    def handle_data(self, data):
+        if self._capture_id:
+            self.fields[self._capture_id] += data
+
+
+class RateLimiter:
+    """Global request budget shared by every scraper session.
+
+    Requests are scheduled on deadlines `interval` seconds apart, so time spent
+    waiting on the server or parsing counts toward the gap instead of adding
+    to it. A late request never lets the next one fire early to catch up.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_fire = time.monotonic()
+
+    def wait(self):
+        """Block until the next request is allowed."""
+        with self._lock:
+            sleep_for = self._next_fire - time.monotonic()
+            if sleep_for > 0:
+                time.sleep(sleep_for)
+            self._next_fire = max(self._next_fire, time.monotonic()) + self.interval
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled sockets send TCP keepalive probes.
+
+    Without them the idle connection can be dropped by a NAT/firewall during
+    the wait between requests, forcing a new TLS handshake.
+    """
+
+    KEEPALIVE_IDLE = 10     # Seconds idle before the first probe (< request delay)
+    KEEPALIVE_INTERVAL = 5  # Seconds between probes
+
+    def init_poolmanager(self, *args, **kwargs):
+        options = list(HTTPConnection.default_socket_options)
+        options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        # Tuning knobs are platform-specific; SO_KEEPALIVE alone still helps
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.KEEPALIVE_IDLE))
+        if hasattr(socket, 'TCP_KEEPINTVL'):
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, self.KEEPALIVE_INTERVAL))
+        kwargs['socket_options'] = options
+        super().init_poolmanager(*args, **kwargs)
+
+
+# Keep one long-lived TLS connection pool for the whole process. It does no
+# retries of its own: urllib3 would resend immediately and bypass the rate
+# limiter, so KPScraper._request retries instead.
+_ADAPTER = KeepAliveAdapter(pool_connections=1, pool_maxsize=1)
+
+
+def _build_session() -> requests.Session:
+    """Create a session with the scraper's AJAX headers on the shared connection pool."""
+    session = requests.Session()
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept': '*/*',
+        'Accept-Language': 'en-US,en;q=0.5',
+        'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
+        'X-Requested-With': 'XMLHttpRequest',
+        'X-MicrosoftAjax': 'Delta=true',
+        'Connection': 'keep-alive',
+        # gzip/deflate always; br only when the brotli package is installed
+        'Accept-Encoding': urllib3.util.make_headers(accept_encoding=True)['accept-encoding'],
+    })
+    session.mount('https://', _ADAPTER)
+    return session
+
+
+_SESSION = _build_session()
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide session (mount custom adapters on it before scraping)."""
+    return _SESSION
+
+
+def new_session() -> requests.Session:
+    """Create a session with its own cookie jar (and so its own ASP.NET session).
+
+    It uses the adapters currently mounted on the process-wide session, so it
+    shares the pooled connections and any custom adapter mounted through
+    get_session().
+    """
+    session = _build_session()
+    for prefix, adapter in get_session().adapters.items():
+        session.mount(prefix, adapter)
+    return session
+
+
 class KPScraper:
-    def __init__(self, delay_seconds: int = 15, verify_ssl: bool = True):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': '*/*',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-            'X-Requested-With': 'XMLHttpRequest',
-            'X-MicrosoftAjax': 'Delta=true',
-            'Connection': 'keep-alive',
-        })
+    _PREFIX = "ctl00$MainContent$InfectionProbabilityCalculations$"
+
+    # Prefixed names of the per-case form fields
+    _K_MODEL = f'{_PREFIX}rbUU'
+    _K_INCIDENCE = f'{_PREFIX}ddlIncidence'
+    _K_GEST = f'{_PREFIX}txtGestational'
+    _K_DAYS = f'{_PREFIX}txtDays'
+    _K_TEMP = f'{_PREFIX}txtTemperature'
+    _K_ROM = f'{_PREFIX}txtROM'
+    _K_GBS = f'{_PREFIX}rbGG'
+    _K_ABX = f'{_PREFIX}rbMM'
+
+    # Model-switch form fields that never change between postbacks
+    _MODEL_FORM = {
+        'ctl00$ctl08': f'{_PREFIX}UpdatePanel4|{_PREFIX}btnUSA',
+        '__ASYNCPOST': 'true',
+        '__EVENTTARGET': '',
+        '__EVENTARGUMENT': '',
+        'flexRadioUSA': 'on',
+        f'{_PREFIX}btnUSA': '',
+    }
+
+    # Calculation form fields that never change between cases
+    _STATIC_FORM = {
+        # AJAX-specific fields
+        'ctl00$ctl08': f'{_PREFIX}UpdatePanel1|{_PREFIX}btnCalc',
+        '__ASYNCPOST': 'true',
+        '__EVENTTARGET': '',
+        '__EVENTARGUMENT': '',
+        'flexRadioUSA': 'on',
+        f'{_PREFIX}ddlFarCal': 'F',
+        'flexRadioGBS': 'on',
+        'flexRadioIntra': 'on',
+        f'{_PREFIX}btnCalc': 'Calculate »',
+    }
+
+    def __init__(self, delay_seconds: int = 15, verify_ssl: bool = True, cache_file: Optional[str] = CACHE_FILE,
+                 rate_limiter: Optional[RateLimiter] = None, session: Optional[requests.Session] = None):
+        # Default to the process-wide session so re-instantiating the scraper
+        # reuses its pooled TLS connection
+        self.session = session if session is not None else get_session()
         self.delay_seconds = delay_seconds
         self.verify_ssl = verify_ssl
+        self.cache_file = cache_file
+        self.rate_limiter = rate_limiter
         self.viewstate = None
         self.viewstate_generator = None
         self.event_validation = None
+        self.model = None  # Model currently selected in this session's page state
 
     def get_initial_page(self) -> bool:
         """Fetch initial page to get VIEWSTATE and other hidden fields."""
         try:
-            # Use standard headers for initial GET
+            # Use standard headers for initial GET; None drops the session's
+            # AJAX-only headers so they aren't sent on a plain page load
             headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+                'Content-Type': None,
+                'X-Requested-With': None,
+                'X-MicrosoftAjax': None,
             }
-            response = self.session.get(BASE_URL, verify=self.verify_ssl, headers=headers)
-            response.raise_for_status()
 
-            soup = BeautifulSoup(response.text, 'html.parser')
+            # Conditional GET: if the page is unchanged since the last run the
+            # server answers 304 and we reuse the cached hidden fields
+            cache = self._load_cache()
+            if cache.get('viewstate'):
+                if cache.get('etag'):
+                    headers['If-None-Match'] = cache['etag']
+                if cache.get('last_modified'):
+                    headers['If-Modified-Since'] = cache['last_modified']
 
-            vs = soup.find('input', {'name': '__VIEWSTATE'})
-            vsg = soup.find('input', {'name': '__VIEWSTATEGENERATOR'})
-            ev = soup.find('input', {'name': '__EVENTVALIDATION'})
-
-            self.viewstate = vs['value'] if vs else None
-            self.viewstate_generator = vsg['value'] if vsg else None
-            self.event_validation = ev['value'] if ev else None
+            response = self._request('GET', headers=headers)
+            response.raise_for_status()
+            self.model = "2017"  # A fresh page loads with the 2017 calculator selected
+
+            if response.status_code == 304:
+                self.viewstate = cache['viewstate']
+                self.viewstate_generator = cache.get('vs_generator')
+                self.event_validation = cache.get('event_validation')
+                print(f"Initial page unchanged (304), using cached VIEWSTATE (length: {len(self.viewstate)})")
+                return True
+
+            # Fast path: pull the three hidden inputs straight from the bytes
+            # in a single scan
+            body = response.content
+            fields = {}
+            for match in RE_HIDDEN_INPUT.finditer(body):
+                fields.setdefault(match.group(1).decode('ascii'), match.group(2).decode('ascii'))
+                if len(fields) == len(HIDDEN_FIELDS):
+                    break
+
+            if len(fields) < len(HIDDEN_FIELDS):
+                # Markup didn't match the expected layout - fall back to a full parse
+                fields = _KPExtractor.extract(body)
+
+            self.viewstate = fields.get('__VIEWSTATE')
+            self.viewstate_generator = fields.get('__VIEWSTATEGENERATOR')
+            self.event_validation = fields.get('__EVENTVALIDATION')
 
             print(f"Got VIEWSTATE (length: {len(self.viewstate) if self.viewstate else 0})")
+            self._save_cache(response)
             return True
 
         except Exception as e:
             print(f"ERROR fetching initial page: {e}")
             return False
 
+    def _throttle(self) -> None:
+        """Wait for the shared rate limiter (if any) before sending a request."""
+        if self.rate_limiter:
+            self.rate_limiter.wait()
+
+    def _request(self, method: str, **kwargs) -> requests.Response:
+        """Send a request to the calculator, retrying gateway errors and dropped connections.
+
+        Every attempt, retries included, waits its turn on the rate limiter
+        (or sleeps --delay without one), so retries stay inside the
+        authorized request rate.
+        """
+        for attempt in range(REQUEST_RETRIES + 1):
+            if attempt and not self.rate_limiter:
+                time.sleep(self.delay_seconds)
+            self._throttle()
+            try:
+                response = self.session.request(method, BASE_URL, verify=self.verify_ssl, **kwargs)
+            except requests.exceptions.SSLError:
+                raise  # A certificate problem won't fix itself on retry
+            except requests.ConnectionError as e:
+                if attempt == REQUEST_RETRIES:
+                    raise
+                print(f"  Connection error ({e}), retrying...")
+                continue
+
+            if response.status_code not in RETRY_STATUSES or attempt == REQUEST_RETRIES:
+                return response
+            print(f"  HTTP {response.status_code}, retrying...")
+            response.close()
+
+    def _load_cache(self) -> dict:
+        """Load cached initial-page validators and hidden fields, if any."""
+        if not self.cache_file:
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, response: requests.Response) -> None:
+        """Persist the initial page's validators so the next run can send a conditional GET."""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not self.cache_file or not self.viewstate or not (etag or last_modified):
+            return
+        try:
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'etag': etag,
+                    'last_modified': last_modified,
+                    'viewstate': self.viewstate,
+                    'vs_generator': self.viewstate_generator,
+                    'event_validation': self.event_validation,
+                }, f)
+        except OSError as e:
+            print(f"WARNING: could not write cache {self.cache_file}: {e}")
+
     def select_model(self, model: str) -> bool:
         """Select the model version (2017 or 2024) - triggers form update."""
-        prefix = "ctl00$MainContent$InfectionProbabilityCalculations$"
-
-        model_map = {
-            "2017": "rbUSAHidden1",
-            "2024": "rbUSAHidden2",
-        }
-
         # Trigger model selection postback
-        form_data = {
-            'ctl00$ctl08': f'{prefix}UpdatePanel4|{prefix}btnUSA',
-            '__ASYNCPOST': 'true',
-            '__EVENTTARGET': '',
-            '__EVENTARGUMENT': '',
+        form_data = self._MODEL_FORM.copy()
+        form_data.update({
             '__VIEWSTATE': self.viewstate,
             '__VIEWSTATEGENERATOR': self.viewstate_generator,
             '__EVENTVALIDATION': self.event_validation,
-            f'{prefix}rbUU': model_map[model],
-            'flexRadioUSA': 'on',
-            f'{prefix}btnUSA': '',
-        }
+            self._K_MODEL: MODEL_MAP[model],
+        })
 
         try:
-            response = self.session.post(BASE_URL, data=form_data, verify=self.verify_ssl)
-            response.raise_for_status()
-
-            # Update viewstate from response
-            vs_match = re.search(r'\|__VIEWSTATE\|([^|]+)\|', response.text)
-            if vs_match:
-                self.viewstate = vs_match.group(1)
-
-            ev_match = re.search(r'\|__EVENTVALIDATION\|([^|]+)\|', response.text)
-            if ev_match:
-                self.event_validation = ev_match.group(1)
-
+            self._read_delta(self._post(form_data))
+            self.model = model
             return True
         except Exception as e:
             print(f"  ERROR selecting model: {e}")
             return False
 
-    def submit_calculation(self, case: tuple) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float], str]:
+    def submit_calculation(self, case: Case) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float], str]:
         """Submit calculation using AJAX UpdatePanel and return results."""
-        model, ga_w, ga_d, temp_f, rom, gbs, abx, incidence = case
-
-        # For 2024 model, first trigger model selection postback
-        if model == "2024":
-            if not self.select_model("2024"):
-                return None, None, None, None, "Failed to select 2024 model"
-            time.sleep(0.5)  # Brief pause after model switch
-
-        # Map GBS to hidden radio button value
-        gbs_map = {
-            "Negative": "rbGBSHidden1",
-            "Positive": "rbGBSHidden2",
-            "Unknown": "rbGBSHidden3",
-        }
-
-        # Map Antibiotics to hidden radio button value
-        abx_map = {
-            "broad4": "rbIntraHidden1",  # Broad spectrum > 4 hrs
-            "broad2": "rbIntraHidden2",  # Broad spectrum 2-3.9 hrs
-            "gbs2": "rbIntraHidden3",    # GBS specific > 2 hrs
-            "none": "rbIntraHidden4",    # No antibiotics or < 2 hrs
-        }
-
-        # Map model to hidden radio button
-        model_map = {
-            "2017": "rbUSAHidden1",
-            "2024": "rbUSAHidden2",
-        }
+        temp_f = case.temp_f
+
+        # Switch models only when this case differs from the last one; the
+        # selection persists in VIEWSTATE across calculations
+        if case.model != self.model:
+            if not self.select_model(case.model):
+                return None, None, None, None, f"Failed to select {case.model} model"
 
         # Get correct incidence value based on model
-        if model == "2024":
-            incidence_value = INCIDENCE_2024.get(incidence, "57.9")
+        if case.model == "2024":
+            incidence_value = INCIDENCE_2024.get(case.incidence, "57.9")
         else:
-            incidence_value = INCIDENCE_2017.get(incidence, "40.56560")
+            incidence_value = INCIDENCE_2017.get(case.incidence, "40.56560")
 
         # Build form data for AJAX UpdatePanel
-        prefix = "ctl00$MainContent$InfectionProbabilityCalculations$"
-
-        form_data = {
-            # AJAX-specific fields
-            'ctl00$ctl08': f'{prefix}UpdatePanel1|{prefix}btnCalc',
-            '__ASYNCPOST': 'true',
-
+        form_data = self._STATIC_FORM.copy()
+        form_data.update({
             # Hidden fields
-            '__EVENTTARGET': '',
-            '__EVENTARGUMENT': '',
             '__VIEWSTATE': self.viewstate,
             '__VIEWSTATEGENERATOR': self.viewstate_generator,
             '__EVENTVALIDATION': self.event_validation,
 
             # Calculator Version (2017 or 2024)
-            f'{prefix}rbUU': model_map[model],
-            'flexRadioUSA': 'on',
+            self._K_MODEL: MODEL_MAP[case.model],
 
             # Incidence dropdown
-            f'{prefix}ddlIncidence': incidence_value,
+            self._K_INCIDENCE: incidence_value,
 
             # Gestational Age
-            f'{prefix}txtGestational': str(ga_w),
-            f'{prefix}txtDays': str(ga_d),
+            self._K_GEST: str(case.ga_w),
+            self._K_DAYS: str(case.ga_d),
 
             # Temperature (use integer for whole numbers to avoid validation error)
-            f'{prefix}txtTemperature': str(int(temp_f)) if temp_f == int(temp_f) else f'{temp_f:.1f}',
-            f'{prefix}ddlFarCal': 'F',
+            self._K_TEMP: str(int(temp_f)) if temp_f == int(temp_f) else f'{temp_f:.1f}',
 
             # ROM
-            f'{prefix}txtROM': str(rom),
+            self._K_ROM: str(case.rom),
 
             # GBS Status
-            f'{prefix}rbGG': gbs_map[gbs],
-            'flexRadioGBS': 'on',
+            self._K_GBS: GBS_MAP[case.gbs],
 
             # Antibiotics
-            f'{prefix}rbMM': abx_map[abx],
-            'flexRadioIntra': 'on',
-
-            # Submit button
-            f'{prefix}btnCalc': 'Calculate »',
-        }
+            self._K_ABX: ABX_MAP[case.abx],
+        })
 
         try:
-            response = self.session.post(BASE_URL, data=form_data, verify=self.verify_ssl)
-            response.raise_for_status()
+            body = self._post(form_data)
 
             # Parse AJAX response (pipe-delimited format)
-            return self._parse_ajax_response(response.text)
+            return self._parse_ajax_response(body)
 
         except Exception as e:
             print(f"  ERROR: {e}")
             return None, None, None, None, str(e)
 
-    def _parse_ajax_response(self, response_text: str) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float], str]:
-        """Parse ASP.NET AJAX UpdatePanel response (pipe-delimited format)."""
+    def _post(self, form_data: dict) -> bytes:
+        """Send an AJAX postback and return the body up to the last field we need.
 
-        risk_birth = None
-        well_appearing = None
-        equivocal = None
-        clinical_illness = None
-        debug_info = ""
-
-        # The AJAX response is pipe-delimited with updatePanel sections
-        # Extract the HTML content from UpdatePanel3 (results section)
+        The response is streamed and scanning stops once VIEWSTATE and
+        EVENTVALIDATION are complete. The remainder (script blocks etc.) is
+        drained without buffering so the keep-alive connection can be reused.
+        """
+        response = self._request('POST', data=form_data, stream=True)
+        try:
+            response.raise_for_status()
 
-        # Look for lblEOS value in response
-        eos_match = re.search(r'lblEOS[^>]*>([0-9.]+)<', response_text)
-        if eos_match:
-            try:
-                risk_birth = float(eos_match.group(1))
-            except ValueError:
+            body = bytearray()
+            scan_from = dict.fromkeys(STREAM_ANCHORS, 0)
+            chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+            for chunk in chunks:
+                body += chunk
+                for anchor, pos in list(scan_from.items()):
+                    start = body.find(anchor, pos)
+                    if start == -1:
+                        scan_from[anchor] = max(pos, len(body) - len(anchor) + 1)
+                    elif body.find(b'|', start + len(anchor)) == -1:
+                        scan_from[anchor] = start  # Value still arriving
+                    else:
+                        del scan_from[anchor]
+                if not scan_from:
+                    break
+
+            for _ in chunks:
                 pass
 
-        # Look for lblWellAppearing value
-        well_match = re.search(r'lblWellAppearing"[^>]*>([0-9.]+)<', response_text)
-        if well_match:
-            try:
-                well_appearing = float(well_match.group(1))
-            except ValueError:
-                pass
+            return bytes(body)
+        finally:
+            response.close()
+
+    def _read_delta(self, body: bytes) -> list:
+        """Walk an AJAX delta response, keeping its hidden fields for the next request.
+
+        Returns the UpdatePanel HTML fragments (or the whole body if it isn't a
+        delta, e.g. a server error page).
+        """
+        text = body.decode('utf-8', 'replace')  # Record lengths count characters, not bytes
+        fragments = []
+        parsed = False
+        seen = set()
+        for part_type, part_id, content in _iter_ajax_parts(text):
+            parsed = True
+            if part_type == 'hiddenField':
+                if part_id == '__VIEWSTATE':
+                    self.viewstate = content
+                elif part_id == '__EVENTVALIDATION':
+                    self.event_validation = content
+                seen.add(part_id)
+            elif part_type == 'updatePanel':
+                fragments.append(content)
+
+        # .NET counts UTF-16 units, so a non-BMP character can throw a record
+        # length off and end the walk early - never keep a stale VIEWSTATE
+        if not {'__VIEWSTATE', '__EVENTVALIDATION'} <= seen:
+            for match in RE_AJAX_HIDDEN.finditer(text):
+                if match.group('field') in seen:
+                    continue
+                if match.group('field') == '__VIEWSTATE':
+                    self.viewstate = match.group('value')
+                else:
+                    self.event_validation = match.group('value')
+
+        return fragments if parsed else [text]
+
+    def _parse_ajax_response(self, body: bytes) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float], str]:
+        """Parse ASP.NET AJAX UpdatePanel response (pipe-delimited format).
+
+        Also updates VIEWSTATE/EVENTVALIDATION for the next request.
+        """
 
-        # Look for lblEquivocal value
-        equi_match = re.search(r'lblEquivocal"[^>]*>([0-9.]+)<', response_text)
-        if equi_match:
-            try:
-                equivocal = float(equi_match.group(1))
-            except ValueError:
-                pass
+        debug_info = ""
+        error_text = None
+
+        # The AJAX response is pipe-delimited with updatePanel sections. The
+        # labels live in UpdatePanel3 (results section), but the validation
+        # message may be rendered in another panel, so every panel fragment is
+        # scanned; the VIEWSTATE record - most of the response - never is.
+        labels = {}
+        for fragment in self._read_delta(body):
+            for match in RE_RESULT.finditer(fragment):
+                if match.group('label'):
+                    if match.group('value'):
+                        try:
+                            labels.setdefault(match.group('label'), float(match.group('value')))
+                        except ValueError:
+                            pass
+                elif error_text is None:
+                    error_text = match.group('error')
+
+        # Unexpected markup (or a validation error) - fall back to a real parse
+        if len(labels) < len(LABEL_NAMES):
+            for name, value in self._parse_labels_fallback(body).items():
+                labels.setdefault(name, value)
+
+        risk_birth = labels.get('EOS')
+        well_appearing = labels.get('WellAppearing')
+        equivocal = labels.get('Equivocal')
+        clinical_illness = labels.get('Clinical')
+
+        # Check for errors in response: a hidden element anywhere in the body
+        # means the message isn't shown. The body ends at the hidden fields
+        # (see _post), so this covers every UpdatePanel but not the script
+        # records after them
+        if error_text and b'display:none' not in body:
+            debug_info = error_text.strip()
+
+        return risk_birth, well_appearing, equivocal, clinical_illness, debug_info
 
-        # Look for lblClinical value
-        clin_match = re.search(r'lblClinical"[^>]*>([0-9.]+)<', response_text)
-        if clin_match:
+    def _parse_labels_fallback(self, body: bytes) -> dict:
+        """Find result labels by element ID with a full parse when the regex fast path misses."""
+        labels = {}
+        fields = _KPExtractor.extract(body)
+
+        for name in LABEL_NAMES:
+            text = fields.get(LABEL_ID_PREFIX + name, '').strip()
+            if not text:
+                continue
             try:
-                clinical_illness = float(clin_match.group(1))
+                labels[name] = float(text)
             except ValueError:
                 pass
 
-        # Update viewstate from response for next request
-        vs_match = re.search(r'\|__VIEWSTATE\|([^|]+)\|', response_text)
-        if vs_match:
-            self.viewstate = vs_match.group(1)
+        return labels
 
-        ev_match = re.search(r'\|__EVENTVALIDATION\|([^|]+)\|', response_text)
-        if ev_match:
-            self.event_validation = ev_match.group(1)
 
-        # Check for errors in response
-        if 'ErrorMessage' in response_text and 'display:none' not in response_text:
-            error_match = re.search(r'class="ErrorMessage"[^>]*>([^<]+)', response_text)
-            if error_match:
-                debug_info = error_match.group(1).strip()
+def _csv_writer_loop(rows: queue.Queue, f, errors: list) -> None:
+    """Write rows from the queue to an open CSV file until a None sentinel arrives.
 
-        return risk_birth, well_appearing, equivocal, clinical_illness, debug_info
+    If a write fails (e.g. disk full) the exception is appended to `errors`
+    and the remaining rows are drained unwritten, so joining the queue never
+    hangs.
+    """
+    writer = csv.writer(f)
+    while True:
+        row = rows.get()
+        try:
+            if row is None:
+                try:
+                    # End of run: make the whole file durable, not just flushed
+                    if not errors:
+                        os.fsync(f.fileno())
+                finally:
+                    f.close()
+            elif not errors:
+                writer.writerow(row)
+                f.flush()  # Keep --resume accurate if the run is interrupted
+        except Exception as e:
+            errors.append(e)
+        finally:
+            rows.task_done()
+        if row is None:
+            return
 
 
 def main():
@@ -430,44 +821,54 @@ def main():
         except FileNotFoundError:
             pass
 
-    # Initialize CSV if new
-    if start_index == 0:
-        with open(args.output, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                'CaseNum', 'Model', 'GA_Weeks', 'GA_Days', 'Temp_F', 'ROM_Hours',
-                'GBS_Status', 'Antibiotics', 'Incidence',
-                'KP_RiskAtBirth', 'KP_WellAppearing', 'KP_Equivocal', 'KP_ClinicalIllness',
-                'Debug', 'Timestamp'
-            ])
-
     print(f"Total cases: {len(cases)}")
     print(f"Starting from: {start_index}")
     print()
 
-    # Initialize scraper
-    scraper = KPScraper(delay_seconds=args.delay, verify_ssl=not args.no_verify_ssl)
+    # Every request - initial GET, model switches, retries - draws from one
+    # deadline-paced budget, so server latency overlaps the wait
+    limiter = RateLimiter(args.delay)
+    scraper = KPScraper(delay_seconds=args.delay, verify_ssl=not args.no_verify_ssl, rate_limiter=limiter)
 
     print("Fetching initial page state...")
     if not scraper.get_initial_page():
         print("Failed to initialize. Exiting.")
         return
 
+    # Open the CSV once for the whole run; a background thread does the
+    # writes so a slow disk never delays the next request
+    csv_f = open(args.output, 'w' if start_index == 0 else 'a', newline='', buffering=1 << 16)
+    csv_rows = queue.Queue()
+    csv_errors = []
+    threading.Thread(target=_csv_writer_loop, args=(csv_rows, csv_f, csv_errors), daemon=True).start()
+    if start_index == 0:
+        csv_rows.put([
+            'CaseNum', 'Model', 'GA_Weeks', 'GA_Days', 'Temp_F', 'ROM_Hours',
+            'GBS_Status', 'Antibiotics', 'Incidence',
+            'KP_RiskAtBirth', 'KP_WellAppearing', 'KP_Equivocal', 'KP_ClinicalIllness',
+            'Debug', 'Timestamp'
+        ])
+
+    # Identical cases are only submitted once and share the result; the list
+    # itself is left alone so case numbers (and --resume) stay stable
+    results = {}
+
     # Process each test case
-    for i in range(start_index, len(cases)):
-        case = cases[i]
-        case_num = i + 1
-        model, ga_w, ga_d, temp_f, rom, gbs, abx, incidence = case
+    try:
+        for i in range(start_index, len(cases)):
+            case = cases[i]
+            case_num = i + 1
 
-        print(f"[{case_num}/{len(cases)}] Model={model} GA={ga_w}w{ga_d}d Temp={temp_f}F ROM={rom}h GBS={gbs} Abx={abx}")
+            print(f"[{case_num}/{len(cases)}] Model={case.model} GA={case.ga_w}w{case.ga_d}d Temp={case.temp_f}F "
+                  f"ROM={case.rom}h GBS={case.gbs} Abx={case.abx}")
 
-        risk_birth, well_appearing, equivocal, clinical_illness, debug = scraper.submit_calculation(case)
+            if case not in results:
+                results[case] = scraper.submit_calculation(case)
+            risk_birth, well_appearing, equivocal, clinical_illness, debug = results[case]
 
-        # Log result
-        with open(args.output, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                case_num, model, ga_w, ga_d, temp_f, rom, gbs, abx, incidence,
+            # Log result
+            csv_rows.put([
+                case_num, *case,
                 risk_birth if risk_birth is not None else 'ERROR',
                 well_appearing if well_appearing is not None else 'ERROR',
                 equivocal if equivocal is not None else 'ERROR',
@@ -475,22 +876,26 @@ def main():
                 debug,
                 datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             ])
-
-        # Save debug response for troubleshooting
-        if i < 3 or risk_birth is None:
-            with open(f'debug_response_{case_num}.txt', 'w', encoding='utf-8') as f:
-                f.write(f"Risk: {risk_birth}, Well: {well_appearing}, Equi: {equivocal}, Clin: {clinical_illness}\n")
-                f.write(f"Debug: {debug}\n")
-
-        if risk_birth is not None:
-            print(f"  -> Birth: {risk_birth} | Well: {well_appearing} | Equi: {equivocal} | Clin: {clinical_illness}")
-        else:
-            print(f"  -> ERROR: {debug[:100] if debug else 'No results found'}")
-
-        # Rate limiting
-        if i < len(cases) - 1:
-            print(f"  Waiting {args.delay} seconds...")
-            time.sleep(args.delay)
+            if csv_errors:
+                raise csv_errors[0]  # Output is lost; don't spend requests on it
+
+            # Save debug response for troubleshooting
+            if i < 3 or risk_birth is None:
+                with open(f'debug_response_{case_num}.txt', 'w', encoding='utf-8') as f:
+                    f.write(f"Risk: {risk_birth}, Well: {well_appearing}, Equi: {equivocal}, Clin: {clinical_illness}\n")
+                    f.write(f"Debug: {debug}\n")
+
+            if risk_birth is not None:
+                print(f"  -> Birth: {risk_birth} | Well: {well_appearing} | Equi: {equivocal} | Clin: {clinical_illness}")
+            else:
+                print(f"  -> ERROR: {debug[:100] if debug else 'No results found'}")
+    finally:
+        # Sentinel: the writer flushes, closes the file and exits
+        csv_rows.put(None)
+        csv_rows.join()
+
+    if csv_errors:
+        raise csv_errors[0]
 
     print()
     print("=" * 60)